@@ -0,0 +1,163 @@
+# app/admission.py
+
+"""
+Controle de admissão das chamadas ao LLM.
+
+Dois token buckets (requisições/segundo e tokens/minuto) limitam o ritmo
+das chamadas. Quem não pode passar na hora entra numa fila limitada,
+ordenada por prioridade e ordem de chegada, com prazo máximo de espera.
+Cada pedido é um Ticket; enquanto não é admitido, sua prioridade pode ser
+antecipada com promote() (ex.: um aluno pega carona numa chamada em lote
+ainda na fila). O prazo do ticket não muda.
+Fila cheia ou prazo estourado => LLMBusyError com o tempo sugerido para
+nova tentativa (usado como Retry-After no HTTP 429).
+"""
+
+import math
+import time
+import itertools
+import threading
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+
+class LLMBusyError(Exception):
+    """LLM saturado: a requisição não foi admitida a tempo."""
+
+    def __init__(self, retry_after: int, message: str = "LLM ocupado, tente novamente."):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+
+    def __init__(self, rate_per_sec: float, capacity: float):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.last
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.last = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate
+
+    def consume(self, amount: float, now: float):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+
+class Ticket:
+    __slots__ = ("tokens", "priority", "deadline", "seq", "admitted")
+
+    def __init__(self, tokens: int, priority: int, deadline: float, seq: int):
+        self.tokens = tokens
+        self.priority = priority
+        self.deadline = deadline
+        self.seq = seq
+        self.admitted = False
+
+
+class AdmissionController:
+
+    def __init__(self, max_rps: float, max_tpm: int, max_queue: int, timeout: float):
+        if max_rps <= 0:
+            raise ValueError(f"LLM_MAX_RPS deve ser maior que zero (recebido {max_rps}).")
+        if max_tpm < 0:
+            raise ValueError(f"LLM_MAX_TPM não pode ser negativo (recebido {max_tpm}); use 0 para desativar.")
+        if max_queue < 1:
+            raise ValueError(f"LLM_QUEUE_MAX deve ser pelo menos 1 (recebido {max_queue}).")
+        if timeout <= 0:
+            raise ValueError(f"LLM_QUEUE_TIMEOUT deve ser maior que zero (recebido {timeout}).")
+
+        self.max_rps = max_rps
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self._requests = TokenBucket(max_rps, max(1.0, max_rps))
+        self._tokens = TokenBucket(max_tpm / 60.0, max_tpm) if max_tpm > 0 else None
+
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        wait = max(0.0, self._paused_until - now)
+        wait = max(wait, self._requests.time_until(1, now))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.time_until(tokens, now))
+        return wait
+
+    def _retry_after(self, tokens: int, now: float) -> int:
+        drain = len(self._waiters) / self.max_rps
+        return max(1, math.ceil(max(self._wait_time(tokens, now), drain)))
+
+    def ticket(self, tokens: int, priority: int = PRIORITY_INTERACTIVE, timeout: float = None) -> Ticket:
+        timeout = self.timeout if timeout is None else timeout
+        return Ticket(tokens, priority, time.monotonic() + timeout, next(self._seq))
+
+    def acquire(self, ticket: Ticket):
+        """
+        Bloqueia até o ticket ser admitido ou levanta LLMBusyError.
+        """
+        with self._cond:
+            now = time.monotonic()
+            if len(self._waiters) >= self.max_queue:
+                raise LLMBusyError(self._retry_after(ticket.tokens, now))
+
+            self._waiters.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    head = min(self._waiters, key=lambda t: (t.priority, t.seq))
+                    if head is ticket:
+                        wait = self._wait_time(ticket.tokens, now)
+                        if wait <= 0:
+                            self._requests.consume(1, now)
+                            if self._tokens is not None:
+                                self._tokens.consume(ticket.tokens, now)
+                            ticket.admitted = True
+                            return
+
+                    remaining = ticket.deadline - now
+                    if remaining <= 0:
+                        raise LLMBusyError(self._retry_after(ticket.tokens, now))
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+    def promote(self, ticket: Ticket, priority: int):
+        """
+        Antecipa um ticket ainda não admitido para a prioridade pedida, se
+        ela for maior. O prazo do ticket fica como está.
+        """
+        with self._cond:
+            if ticket.admitted or priority >= ticket.priority:
+                return
+            ticket.priority = priority
+            self._cond.notify_all()
+
+    def retry_after(self, tokens: int) -> int:
+        with self._cond:
+            return self._retry_after(tokens, time.monotonic())
+
+    def pause(self, seconds: float):
+        """
+        Suspende as admissões (ex.: o provedor respondeu 429).
+        """
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
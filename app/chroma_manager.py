@@ -2,9 +2,11 @@
 Gerenciamento do ChromaDB.
 """
 import os
+import re
 import json
 import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
 
 import chromadb
@@ -13,11 +15,15 @@ from tqdm import tqdm
 from app.config import (
     CHROMA_DB_PATH,
     COLLECTION_NAME,
-    PDF_FILES,
     HASH_MAP_FILE,
+    SHARDS,
+    SHARD_SEARCH_WORKERS,
+    INDEX_FORMAT_VERSION,
+    CHUNKING_STRATEGY,
 )
 from app.embeddings import get_embedding_function
-from app.pdf_loader import extract_text_from_pdf
+from app.index_tables import load_index_tables, save_index_tables
+from app.pdf_loader import extract_text_from_pdf, get_pdf_backend
 
 
 logger = logging.getLogger("app.chroma_manager")
@@ -49,6 +55,17 @@ def compute_pdf_hash(pdf_path: str) -> str:
         return ""
 
 
+def index_signature(pdf_hash: str) -> str:
+    """
+    Valor gravado no hash map: hash do PDF + versão do formato do índice
+    + estratégia de chunking + extrator de PDF (trocar qualquer um deles
+    força reindexação).
+    """
+    if not pdf_hash:
+        return ""
+    return f"{pdf_hash}:v{INDEX_FORMAT_VERSION}:{CHUNKING_STRATEGY}:{get_pdf_backend().name}"
+
+
 def load_hash_map() -> Dict[str, str]:
     if os.path.exists(HASH_MAP_FILE):
         try:
@@ -68,122 +85,174 @@ def save_hash_map(hash_map: Dict[str, str]):
 
 
 # cria coleção
-def get_or_create_collection():
+def get_or_create_collection(name: str = COLLECTION_NAME):
     client = get_chroma_client()
     try:
         collection = client.get_or_create_collection(
-            name=COLLECTION_NAME,
+            name=name,
             embedding_function=get_embedding_function()
         )
         return collection
     except Exception as e:
-        logger.error(f"Erro ao criar/abrir coleção '{COLLECTION_NAME}': {e}")
+        logger.error(f"Erro ao criar/abrir coleção '{name}': {e}")
         raise
 
-def remove_pdf_chunks(collection, pdf_name: str):
+def chunk_id_prefix(pdf: str) -> str:
+    return f"{os.path.basename(pdf)}__"
+
+
+def remove_pdf_chunks(collection, doc_id: int, pdf_name: str = None):
+    """
+    Remove os chunks do PDF. O doc_id depende de index_tables.json, que
+    outro processo pode ter renumerado; por isso também apaga pelo prefixo
+    do id do chunk, que fica gravado na própria linha.
+    """
     try:
-        result = collection.get(include=["metadatas"])
-        ids = result.get("ids", [])
-        metadatas = result.get("metadatas", [])
-
-        if ids and isinstance(ids[0], list):
-            ids = ids[0]
-        if metadatas and isinstance(metadatas[0], list):
-            metadatas = metadatas[0]
-
-        ids_to_delete = [
-            _id for _id, md in zip(ids, metadatas)
-            if isinstance(md, dict) and md.get("pdf_name") == pdf_name
-        ]
-
-        if ids_to_delete:
-            collection.delete(ids=ids_to_delete)
+        collection.delete(where={"doc_id": doc_id})
+        if pdf_name:
+            # Linhas no formato antigo (caminho do PDF em cada metadado)
+            collection.delete(where={"pdf_name": pdf_name})
+
+            prefix = chunk_id_prefix(pdf_name)
+            ids = collection.get(include=[]).get("ids") or []
+            stale = [cid for cid in ids if cid.startswith(prefix)]
+            if stale:
+                collection.delete(ids=stale)
     except Exception as e:
-        logger.error(f"Erro ao remover chunks de '{pdf_name}': {e}")
+        logger.error(f"Erro ao remover chunks do documento {doc_id}: {e}")
+
+
+# Shards
+def active_shards() -> List[str]:
+    """
+    Shards com ao menos um PDF configurado.
+    """
+    return [name for name, shard in SHARDS.items() if shard["pdf_files"]]
+
+
+def route_query(q_norm: str) -> List[str]:
+    """
+    Shards relevantes para a consulta (já normalizada): os "always" mais os
+    que têm palavra-chave presente. Sem palavra-chave, consulta todos.
+    """
+    shards = active_shards()
+    matched = [
+        name for name in shards
+        if any(re.search(rf"\b{re.escape(k)}\b", q_norm or "") for k in SHARDS[name]["keywords"])
+    ]
+    if not matched:
+        return shards
+    return [name for name in shards if SHARDS[name].get("always") or name in matched]
 
 
 # Atualização incremental
-def update_embeddings():
+def _index_pdf(collection, pdf: str) -> int:
+    import gc
+
+    docs = extract_text_from_pdf(pdf)
+
+    if not docs:
+        print("    -> Nenhum texto extraído.")
+        return 0
+
+    print(f"Etapa 5/5: Indexando {len(docs)} chunks (isso pode demorar)...")
+    tables = load_index_tables()
+    doc_id = tables.doc_id(pdf)
+    remove_pdf_chunks(collection, doc_id, pdf) 
+    tables.clear_document(doc_id)
+
+    BATCH_SIZE = 5 
+    batch_docs = []
+    batch_ids = []
+    batch_metas = []
+    count = 0
+
+    for i, d in tqdm(enumerate(docs), total=len(docs), desc="    -> Indexando"):
+        chunk_id = (
+            f"{chunk_id_prefix(pdf)}page{d.page_number}__chunk{i}"
+        )
+        tables.set_chunk_urls(doc_id, chunk_id, d.urls)
+
+        batch_docs.append(d.text)
+        batch_ids.append(chunk_id)
+        batch_metas.append({
+            "doc_id": doc_id,
+            "page_number": d.page_number,
+            "char_start": d.char_start,
+            "char_end": d.char_end,
+            "contains_paren_link": d.contains_paren_link,
+        })
+
+        if len(batch_docs) == BATCH_SIZE:
+            collection.add(
+                documents=batch_docs,
+                ids=batch_ids,
+                metadatas=batch_metas
+            )
+            count += len(batch_docs)
+            batch_docs.clear()
+            batch_ids.clear()
+            batch_metas.clear()
+            gc.collect() 
+
+    if batch_docs:
+        collection.add(
+            documents=batch_docs,
+            ids=batch_ids,
+            metadatas=batch_metas
+        )
+        count += len(batch_docs)
+        gc.collect()
+
+    save_index_tables(tables)
+    return count
+
+
+def update_embeddings(shard_names: List[str] = None):
+    """
+    Reindexa os PDFs modificados. shard_names limita a atualização a alguns
+    shards; os demais ficam intactos.
+    """
     
     print("\n--- Iniciando verificação do banco de dados (RAG) ---")
 
     print("Etapa 1/5: Carregando hashes...")
     old_hashes = load_hash_map()
     new_hashes = {}
-    
-    print("Etapa 2/5: Abrindo coleção no ChromaDB...")
-    collection = get_or_create_collection()
 
-    import gc
+    selected = shard_names or active_shards()
     pdf_atualizado = False
 
-    for pdf in PDF_FILES:
-        print(f"Etapa 3/5: Verificando PDF '{os.path.basename(pdf)}'...")
-        current_hash = compute_pdf_hash(pdf)
-        new_hashes[pdf] = current_hash
-
-        if not current_hash:
+    for shard_name, shard in SHARDS.items():
+        if shard_name not in selected:
+            for pdf in shard["pdf_files"]:
+                if pdf in old_hashes:
+                    new_hashes[pdf] = old_hashes[pdf]
             continue
 
-        if old_hashes.get(pdf) == current_hash:
-            print("    -> PDF sem modificações.")
+        if not shard["pdf_files"]:
             continue
 
-        pdf_atualizado = True
-        print(f"Etapa 4/5: PDF modificado. Extraindo texto...")
-        docs = extract_text_from_pdf(pdf)
+        print(f"Etapa 2/5: Abrindo coleção '{shard['collection']}' (shard '{shard_name}')...")
+        collection = get_or_create_collection(shard["collection"])
 
-        if not docs:
-            print("    -> Nenhum texto extraído.")
-            continue
-
-        print(f"Etapa 5/5: Indexando {len(docs)} chunks (isso pode demorar)...")
-        remove_pdf_chunks(collection, pdf) 
+        for pdf in shard["pdf_files"]:
+            print(f"Etapa 3/5: Verificando PDF '{os.path.basename(pdf)}'...")
+            current_hash = index_signature(compute_pdf_hash(pdf))
+            new_hashes[pdf] = current_hash
 
-        BATCH_SIZE = 5 
-        batch_docs = []
-        batch_ids = []
-        batch_metas = []
-        count = 0
+            if not current_hash:
+                continue
 
-        for i, d in tqdm(enumerate(docs), total=len(docs), desc="    -> Indexando"):
-            doc_id = (
-                f"{os.path.basename(pdf)}__page{d['page_number']}__chunk{i}"
-            )
+            if old_hashes.get(pdf) == current_hash:
+                print("    -> PDF sem modificações.")
+                continue
 
-            batch_docs.append(d["text"])
-            batch_ids.append(doc_id)
-            batch_metas.append({
-                "pdf_name": pdf,
-                "page_number": d["page_number"],
-                "char_start": d["char_start"],
-                "char_end": d["char_end"],
-                "contains_paren_link": d["contains_paren_link"],
-                "source_urls": d["source_urls"] 
-            })
-
-            if len(batch_docs) == BATCH_SIZE:
-                collection.add(
-                    documents=batch_docs,
-                    ids=batch_ids,
-                    metadatas=batch_metas
-                )
-                count += len(batch_docs)
-                batch_docs.clear()
-                batch_ids.clear()
-                batch_metas.clear()
-                gc.collect() 
-
-        if batch_docs:
-            collection.add(
-                documents=batch_docs,
-                ids=batch_ids,
-                metadatas=batch_metas
-            )
-            count += len(batch_docs)
-            gc.collect()
+            pdf_atualizado = True
+            print(f"Etapa 4/5: PDF modificado. Extraindo texto...")
+            count = _index_pdf(collection, pdf)
 
-        print(f"    -> {count} chunks indexados com sucesso.")
+            print(f"    -> {count} chunks indexados com sucesso.")
 
     if not pdf_atualizado:
         print("Etapa 3/5: Verificação concluída. Nenhum PDF modificado.")
@@ -195,16 +264,104 @@ def update_embeddings():
     print("--- Verificação do RAG concluída! ---")
 
 
-def vector_search(collection, query: str, alt_query: str, k: int = 20):
-    def _safe_query(q):
+def _split_query_result(res: Dict[str, Any], n: int) -> List[Dict[str, Any]]:
+    """
+    Separa o resultado de um collection.query com N consultas em N resultados
+    no mesmo formato de uma consulta única (listas aninhadas de tamanho 1).
+    """
+    keys = ("ids", "documents", "metadatas", "distances")
+    out = []
+    for i in range(n):
+        item = {}
+        for key in keys:
+            values = res.get(key) if isinstance(res, dict) else None
+            item[key] = [values[i]] if values is not None and i < len(values) else []
+        out.append(item)
+    return out
+
+
+_search_pool = ThreadPoolExecutor(max_workers=SHARD_SEARCH_WORKERS)
+
+EMPTY_RESULT = {"documents": [], "metadatas": [], "distances": [], "ids": []}
+
+
+def _query_shard(shard_name: str, embeddings: List[Any], k: int):
+    collection = get_or_create_collection(SHARDS[shard_name]["collection"])
+    res = collection.query(
+        query_embeddings=embeddings,
+        n_results=k,
+        include=["documents", "metadatas", "distances"]
+    )
+    return _split_query_result(res, len(embeddings))
+
+
+def _merge_results(results: List[Dict[str, Any]], k: int) -> Dict[str, Any]:
+    """
+    Junta os top-k de vários shards para a mesma consulta, ordenando por distância.
+    """
+    hits = []
+    for res in results:
+        ids = res.get("ids") or [[]]
+        docs = res.get("documents") or [[]]
+        metas = res.get("metadatas") or [[]]
+        dists = res.get("distances") or [[]]
+        hits.extend(zip(dists[0], ids[0], docs[0], metas[0]))
+
+    hits.sort(key=lambda h: h[0])
+    hits = hits[:k]
+    return {
+        "ids": [[h[1] for h in hits]],
+        "documents": [[h[2] for h in hits]],
+        "metadatas": [[h[3] for h in hits]],
+        "distances": [[h[0] for h in hits]],
+    }
+
+
+def vector_search_batch(queries: List[str], k: int = 20,
+                        routes: List[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Busca várias consultas de uma vez. As consultas são embedadas num só
+    lote; cada shard recebe um único collection.query com as consultas
+    roteadas para ele, e os shards rodam em paralelo. routes[i] lista os
+    shards da consulta i (padrão: todos os ativos).
+    """
+    if not queries:
+        return []
+
+    shards = active_shards()
+    routes = routes or [shards] * len(queries)
+
+    try:
+        embeddings = get_embedding_function()(list(queries))
+    except Exception as e:
+        logger.error(f"Erro ao gerar embeddings de {len(queries)} consultas: {e}")
+        return [dict(EMPTY_RESULT) for _ in queries]
+
+    # shard -> índices das consultas roteadas para ele
+    per_shard = {}
+    for idx, route in enumerate(routes):
+        for name in route:
+            per_shard.setdefault(name, []).append(idx)
+
+    futures = {
+        name: _search_pool.submit(_query_shard, name, [embeddings[i] for i in idxs], k)
+        for name, idxs in per_shard.items()
+    }
+
+    partials = [[] for _ in queries]
+    for name, fut in futures.items():
         try:
-            return collection.query(
-                query_texts=[q],
-                n_results=k,
-                include=["documents", "metadatas", "distances"]
-            )
+            shard_results = fut.result()
         except Exception as e:
-            logger.error(f"Erro na busca vetorial com '{q}': {e}")
-            return {"documents": [], "metadatas": [], "distances": [], "ids": []}
+            logger.error(f"Erro na busca vetorial no shard '{name}': {e}")
+            continue
+        for idx, res in zip(per_shard[name], shard_results):
+            partials[idx].append(res)
+
+    return [_merge_results(p, k) for p in partials]
+
 
-    return _safe_query(query), _safe_query(alt_query)
\ No newline at end of file
+def vector_search(query: str, alt_query: str, k: int = 20, shards: List[str] = None):
+    routes = [shards, shards] if shards else None
+    res_main, res_alt = vector_search_batch([query, alt_query], k=k, routes=routes)
+    return res_main, res_alt
@@ -0,0 +1,289 @@
+"""
+Estratégias de chunking do texto extraído dos PDFs.
+
+Cada estratégia recebe a lista de páginas [(page_number, texto)] — texto
+com as quebras de linha originais — e devolve uma lista de Chunk.
+
+- "fixed": janelas fixas de CHUNK_SIZE caracteres por página (legado).
+- "structure": remove cabeçalhos/rodapés repetidos, quebra por frases e
+  seções (atravessando páginas) e agrupa até CHUNK_TOKEN_BUDGET tokens
+  estimados (razão fixa de caracteres, ver utils.estimate_tokens).
+"""
+import re
+import sys
+import logging
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+from app.config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNKING_STRATEGY,
+    CHUNK_TOKEN_BUDGET,
+    CHUNK_OVERLAP_TOKENS,
+    CHARS_PER_TOKEN,
+    BOILERPLATE_MIN_PAGE_RATIO,
+)
+from app.utils import (
+    extract_urls,
+    contains_paren_link,
+    normalize_whitespace,
+    estimate_tokens,
+)
+
+logger = logging.getLogger("app.chunking")
+logger.setLevel(logging.INFO)
+
+Page = Tuple[int, str]
+
+# Linhas de borda de página analisadas na detecção de cabeçalho/rodapé
+EDGE_LINES = 2
+BOILERPLATE_MAX_CHARS = 100
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\s+(?=[●○•▪])")
+NUMBERED_HEADING = re.compile(r"^\d+(\.\d+)*\.?\s+\S")
+DIGITS = re.compile(r"\d+")
+
+
+class Chunk:
+    """
+    Registro compacto de um chunk (sem __dict__). O PDF de origem não é
+    repetido aqui; as URLs são strings internadas.
+    """
+    __slots__ = ("page_number", "text", "char_start", "char_end", "contains_paren_link", "urls")
+
+    def __init__(self, page_number: int, text: str, char_start: int, char_end: int):
+        self.page_number = page_number
+        self.text = text
+        self.char_start = char_start
+        self.char_end = char_end
+        self.contains_paren_link = contains_paren_link(text)
+        self.urls = tuple(sys.intern(u) for u in extract_urls(text))
+
+    def __repr__(self):
+        return f"Chunk(page={self.page_number}, chars={self.char_start}-{self.char_end})"
+
+
+# ============================================================
+# Estratégia "fixed"
+# ============================================================
+
+def chunk_fixed_window(pages: List[Page]) -> List[Chunk]:
+    chunks = []
+
+    step = CHUNK_SIZE - CHUNK_OVERLAP
+    if step <= 0:
+        step = CHUNK_SIZE
+
+    for page_number, raw_text in pages:
+        text = normalize_whitespace(raw_text)
+        if not text:
+            continue
+
+        start = 0
+        text_len = len(text)
+
+        while start < text_len:
+            end = min(start + CHUNK_SIZE, text_len)
+            chunks.append(Chunk(page_number, text[start:end], start, end))
+
+            if end == text_len:
+                break
+
+            start += step
+
+    return chunks
+
+
+# ============================================================
+# Estratégia "structure"
+# ============================================================
+
+def _page_lines(raw_text: str) -> List[str]:
+    lines = (normalize_whitespace(line) for line in (raw_text or "").split("\n"))
+    lines = [line for line in lines if line]
+
+    # Alguns PDFs saem com uma palavra por linha no PyPDF2; aí as quebras
+    # não dizem nada sobre a estrutura e a página vira uma linha só.
+    if lines and sum(len(l.split()) for l in lines) / len(lines) < 2:
+        return [" ".join(lines)]
+    return lines
+
+
+def _boilerplate_key(line: str) -> str:
+    # Números mudam de página para página ("Página 3 de 10")
+    return DIGITS.sub("#", line.lower())
+
+
+def detect_boilerplate(pages_lines: List[List[str]]) -> set:
+    """
+    Linhas (com dígitos mascarados) que aparecem na borda de pelo menos
+    BOILERPLATE_MIN_PAGE_RATIO das páginas: cabeçalhos e rodapés.
+    """
+    if len(pages_lines) < 3:
+        return set()
+
+    counts = Counter()
+    for lines in pages_lines:
+        edges = lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+        # Linhas de uma só palavra não identificam cabeçalho com segurança
+        counts.update({
+            _boilerplate_key(l) for l in edges
+            if len(l.split()) > 1 and len(l) <= BOILERPLATE_MAX_CHARS
+        })
+
+    min_pages = max(2, int(len(pages_lines) * BOILERPLATE_MIN_PAGE_RATIO + 0.5))
+    return {key for key, n in counts.items() if n >= min_pages}
+
+
+def _strip_boilerplate(lines: List[str], boilerplate: set) -> List[str]:
+    if not boilerplate:
+        return lines
+    n = len(lines)
+    return [
+        line for i, line in enumerate(lines)
+        if not ((i < EDGE_LINES or i >= n - EDGE_LINES) and _boilerplate_key(line) in boilerplate)
+    ]
+
+
+def _is_heading(line: str) -> bool:
+    if len(line) > 80:
+        return False
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) >= 3 and all(c.isupper() for c in letters):
+        return True
+    if NUMBERED_HEADING.match(line) and not line.endswith("."):
+        return True
+    return line.endswith(":") and len(line.split()) <= 8
+
+
+def _sections(pages: List[Page]) -> List[List[Tuple[str, int]]]:
+    """
+    Agrupa as linhas do documento inteiro em seções, iniciadas por títulos.
+    Cada linha carrega o número da página de origem.
+    """
+    pages_lines = [(number, _page_lines(text)) for number, text in pages]
+    boilerplate = detect_boilerplate([lines for _, lines in pages_lines])
+    if boilerplate:
+        logger.info(f"[Chunking] {len(boilerplate)} linhas repetidas removidas (cabeçalho/rodapé).")
+
+    sections, current = [], []
+    for page_number, lines in pages_lines:
+        for line in _strip_boilerplate(lines, boilerplate):
+            if _is_heading(line) and current:
+                sections.append(current)
+                current = []
+            current.append((line, page_number))
+    if current:
+        sections.append(current)
+    return sections
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    parts = []
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        parts.append(sentence[:cut].strip())
+        sentence = sentence[cut:].strip()
+    if sentence:
+        parts.append(sentence)
+    return parts
+
+
+def _section_sentences(section: List[Tuple[str, int]], base: int):
+    """
+    Frases da seção como (texto, página, início, fim), com posições no
+    texto contínuo do documento.
+    """
+    text = " ".join(line for line, _ in section)
+
+    # Offset de início de cada linha -> página
+    line_starts, pos = [], 0
+    for line, page_number in section:
+        line_starts.append((pos, page_number))
+        pos += len(line) + 1
+
+    def page_at(offset):
+        page = line_starts[0][1]
+        for start, page_number in line_starts:
+            if start > offset:
+                break
+            page = page_number
+        return page
+
+    max_chars = CHUNK_TOKEN_BUDGET * CHARS_PER_TOKEN
+    sentences, start = [], 0
+    for match in list(SENTENCE_BOUNDARY.finditer(text)) + [None]:
+        end = match.start() if match else len(text)
+        raw = text[start:end]
+        offset = start
+        for part in _split_long(raw, max_chars):
+            offset = text.find(part, offset)
+            sentences.append((part, page_at(offset), base + offset, base + offset + len(part)))
+            offset += len(part)
+        if match:
+            start = match.end()
+
+    return sentences, base + len(text) + 1
+
+
+def chunk_by_structure(pages: List[Page]) -> List[Chunk]:
+    chunks = []
+    current = []  # frases do chunk em construção
+    current_tokens = 0
+
+    def flush():
+        if current:
+            text = " ".join(s[0] for s in current)
+            chunks.append(Chunk(current[0][1], text, current[0][2], current[-1][3]))
+
+    base = 0
+    for section in _sections(pages):
+        sentences, base_next = _section_sentences(section, base)
+        base = base_next
+
+        # Seção nova começa chunk novo se o atual já está razoavelmente cheio
+        if current and current_tokens >= CHUNK_TOKEN_BUDGET // 2:
+            flush()
+            current, current_tokens = [], 0
+
+        for sentence in sentences:
+            tokens = estimate_tokens(sentence[0])
+
+            if current and current_tokens + tokens > CHUNK_TOKEN_BUDGET:
+                flush()
+
+                # Sobreposição: últimas frases do chunk anterior. Fica de fora
+                # se repetiria o chunk inteiro ou estouraria o orçamento.
+                overlap, overlap_tokens = [], 0
+                for prev in reversed(current):
+                    t = estimate_tokens(prev[0])
+                    if overlap_tokens + t > CHUNK_OVERLAP_TOKENS:
+                        break
+                    overlap.insert(0, prev)
+                    overlap_tokens += t
+                if len(overlap) == len(current) or overlap_tokens + tokens > CHUNK_TOKEN_BUDGET:
+                    overlap, overlap_tokens = [], 0
+                current, current_tokens = overlap, overlap_tokens
+
+            current.append(sentence)
+            current_tokens += tokens
+
+    flush()
+    return chunks
+
+
+CHUNKERS: Dict[str, Callable[[List[Page]], List[Chunk]]] = {
+    "fixed": chunk_fixed_window,
+    "structure": chunk_by_structure,
+}
+
+
+def get_chunker(name: str = CHUNKING_STRATEGY):
+    chunker = CHUNKERS.get(name)
+    if chunker is None:
+        logger.warning(f"[Chunking] Estratégia '{name}' desconhecida. Usando 'fixed'.")
+        chunker = chunk_fixed_window
+    return chunker
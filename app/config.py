@@ -1,4 +1,5 @@
 import os
+import glob
 import unicodedata
 
 def _normalize_term(term: str) -> str:
@@ -21,18 +22,86 @@ OLLAMA_EMBEDDING_MODEL = "nomic-embed-text:latest"
 CHROMA_DB_PATH = os.path.abspath(os.environ.get("CHROMA_DB_PATH", "banco_de_dados_da_ia_local"))
 COLLECTION_NAME = os.environ.get("COLLECTION_NAME", "meu_conhecimento")
 
+# Tabelas de documentos/URLs referenciadas pelos metadados do Chroma
+INDEX_TABLES_FILE = os.path.join(CHROMA_DB_PATH, "index_tables.json")
+
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(APP_DIR)
 PDF_FILES = [os.path.join(PROJECT_ROOT, "arquivos", "documento_final.pdf")]
 
+# Shards: uma coleção por família de documentos, reindexável sem tocar nas
+# demais. Consultas que citam "keywords" de um shard são roteadas para ele;
+# shards "always" entram em toda consulta. Shards sem PDFs ficam inativos.
+SHARDS = {
+    "manual": {
+        "collection": COLLECTION_NAME,
+        "pdf_files": PDF_FILES,
+        "keywords": [],
+        "always": True,
+    },
+    "ppc": {
+        "collection": f"{COLLECTION_NAME}_ppc",
+        "pdf_files": sorted(glob.glob(os.path.join(PROJECT_ROOT, "arquivos", "ppc", "*.pdf"))),
+        "keywords": ["ppc", "projeto pedagógico", "currículo", "grade curricular", "disciplina", "habilitação"],
+    },
+    "calendario": {
+        "collection": f"{COLLECTION_NAME}_calendario",
+        "pdf_files": sorted(glob.glob(os.path.join(PROJECT_ROOT, "arquivos", "calendario", "*.pdf"))),
+        "keywords": ["calendário", "prazo", "data", "período", "semestre", "feriado"],
+    },
+}
+SHARD_SEARCH_WORKERS = 4
+
+# Estratégia de chunking: "structure" (frases/seções, orçamento em tokens)
+# ou "fixed" (janelas fixas de CHUNK_SIZE caracteres por página)
+CHUNKING_STRATEGY = os.environ.get("CHUNKING_STRATEGY", "structure")
+
 CHUNK_SIZE = 1000 
 CHUNK_OVERLAP = 100
+
+# "Tokens" aqui são estimados por uma razão fixa de caracteres por token
+# (utils.estimate_tokens), não pelo tokenizador do modelo de embedding.
+# Na prática o orçamento é de ~1400 caracteres por chunk e ~160 de sobreposição;
+# em português o tokenizador real costuma contar mais tokens que isso.
+CHARS_PER_TOKEN = 4
+CHUNK_TOKEN_BUDGET = 350
+CHUNK_OVERLAP_TOKENS = 40
+BOILERPLATE_MIN_PAGE_RATIO = 0.5
+
 HASH_MAP_FILE = "pdf_hashes.json"
 
+# Extrator de texto dos PDFs: "pymupdf" (mais rápido) ou "pypdf2".
+# Sem PyMuPDF instalado, cai para o PyPDF2.
+PDF_BACKEND = os.environ.get("PDF_BACKEND", "pymupdf")
+PAGE_CACHE_FILE = "pdf_page_cache.json"
+
+# Incrementar quando mudar algo que torna o índice existente incompatível
+# (ex.: endpoint de embedding, chunking). Força a reindexação dos PDFs.
+INDEX_FORMAT_VERSION = 3
+
+# Snapshot do índice (exportado uma vez e importado nos demais nós)
+SNAPSHOT_FORMAT_VERSION = 3
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "")
+SNAPSHOT_BATCH_SIZE = 500
+
 MAX_CONTEXT_CHUNKS = 5
 
 EMBEDDING_RETRY_ATTEMPTS = 3
 EMBEDDING_RETRY_BACKOFF = 1.2
+EMBEDDING_BATCH_SIZE = 64
+
+# Perguntas em lote (/ask/batch)
+BATCH_MAX_QUESTIONS = int(os.environ.get("BATCH_MAX_QUESTIONS", "500"))
+BATCH_LLM_CONCURRENCY = int(os.environ.get("BATCH_LLM_CONCURRENCY", "8"))
+
+# Controle de admissão das chamadas ao Gemini
+LLM_MAX_RPS = float(os.environ.get("LLM_MAX_RPS", "5"))
+LLM_MAX_TPM = int(os.environ.get("LLM_MAX_TPM", "1000000"))
+LLM_QUEUE_MAX = int(os.environ.get("LLM_QUEUE_MAX", "64"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "15"))
+LLM_BATCH_QUEUE_TIMEOUT = float(os.environ.get("LLM_BATCH_QUEUE_TIMEOUT", "120"))
+LLM_EST_OUTPUT_TOKENS = 512
+LLM_THROTTLE_PAUSE = 5
 
 _RAW_PEDAGOGICAL_TERMS = [
     "ppc", "projeto pedagógico", "currículo", "repositório digital",
@@ -40,4 +109,7 @@ _RAW_PEDAGOGICAL_TERMS = [
     "comgrad", "tcc", "calendário acadêmico", "estágio", "matrícula"
 ]
 
-PEDAGOGICAL_TERMS = [_normalize_term(t) for t in _RAW_PEDAGOGICAL_TERMS]
\ No newline at end of file
+PEDAGOGICAL_TERMS = [_normalize_term(t) for t in _RAW_PEDAGOGICAL_TERMS]
+
+for _shard in SHARDS.values():
+    _shard["keywords"] = [_normalize_term(t) for t in _shard["keywords"]]
\ No newline at end of file
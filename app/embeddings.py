@@ -7,7 +7,8 @@ from chromadb.utils.embedding_functions import EmbeddingFunction
 from app.config import (
     OLLAMA_EMBEDDING_MODEL,
     EMBEDDING_RETRY_ATTEMPTS,
-    EMBEDDING_RETRY_BACKOFF
+    EMBEDDING_RETRY_BACKOFF,
+    EMBEDDING_BATCH_SIZE
 )
 
 logger = logging.getLogger("app.embeddings")
@@ -17,21 +18,19 @@ logger.setLevel(logging.INFO)
 class OllamaEmbeddingFunction(EmbeddingFunction):
 
     def __call__(self, texts: List[Any]):
-        embeddings = []
+        texts = [(t if isinstance(t, str) else str(t)).strip() for t in texts]
+        embeddings = [None] * len(texts)
 
-        for idx, text in enumerate(texts):
-            if not isinstance(text, str):
-                text = str(text)
-            text = text.strip()
+        # Textos não vazios vão para o Ollama em lotes (uma chamada por lote)
+        pending = [(idx, text) for idx, text in enumerate(texts) if text]
+        for start in range(0, len(pending), EMBEDDING_BATCH_SIZE):
+            batch = pending[start:start + EMBEDDING_BATCH_SIZE]
+            vectors = self._embed_batch_with_retry([text for _, text in batch])
+            for (idx, _), emb in zip(batch, vectors):
+                embeddings[idx] = emb
 
-            if not text:
-                embeddings.append([0.0] * 768) 
-                continue
-
-            embedding = self._embed_with_retry(text, idx)
-            embeddings.append(embedding)
-
-        return embeddings
+        dimension = next((len(e) for e in embeddings if e), 768)
+        return [e if e is not None else [0.0] * dimension for e in embeddings]
 
  
     def _embed_with_retry(self, text: str, index: int):
@@ -40,22 +39,13 @@ class OllamaEmbeddingFunction(EmbeddingFunction):
 
         for attempt in range(EMBEDDING_RETRY_ATTEMPTS):
             try:
-                resp = ollama.embeddings(
+                resp = ollama.embed(
                     model=OLLAMA_EMBEDDING_MODEL,
-                    prompt=text 
+                    input=text 
                 )
-
-                if isinstance(resp, dict) and "embedding" in resp:
-                    emb = resp["embedding"]
-                    dimension = len(emb) 
-                    return emb
-
-                if hasattr(resp, "embedding"):
-                    emb = resp.embedding
-                    dimension = len(emb)
-                    return emb
-
-                raise ValueError(f"Formato inesperado do Ollama: {resp}")
+                emb = _parse_embed_response(resp, expected=1)[0]
+                dimension = len(emb)
+                return emb
 
             except Exception as e:
                 last_error = e
@@ -82,8 +72,40 @@ class OllamaEmbeddingFunction(EmbeddingFunction):
 
 
     def _embed_batch_with_retry(self, texts_batch: List[str]):
-        logger.warning("[Embedding] _embed_batch_with_retry não é suportada por esta versão do 'ollama'. Revertendo para singular.")
-        return [[0.0] * 768 for _ in range(len(texts_batch))]
+        last_error = None
+
+        for attempt in range(EMBEDDING_RETRY_ATTEMPTS):
+            try:
+                resp = ollama.embed(
+                    model=OLLAMA_EMBEDDING_MODEL,
+                    input=texts_batch
+                )
+                return _parse_embed_response(resp, expected=len(texts_batch))
+
+            except Exception as e:
+                last_error = e
+                wait = EMBEDDING_RETRY_BACKOFF ** attempt
+                logger.warning(
+                    f"[Embedding] Falha no lote de {len(texts_batch)} textos (tentativa {attempt+1}/"
+                    f"{EMBEDDING_RETRY_ATTEMPTS}). Aguardando {wait:.1f}s..."
+                )
+                time.sleep(wait)
+
+        logger.error(f"[Embedding] Lote falhou ({last_error}). Revertendo para singular.")
+        return [self._embed_with_retry(text, idx) for idx, text in enumerate(texts_batch)]
+
+
+def _parse_embed_response(resp, expected: int):
+    if isinstance(resp, dict) and "embeddings" in resp:
+        embs = resp["embeddings"]
+    elif hasattr(resp, "embeddings"):
+        embs = resp.embeddings
+    else:
+        raise ValueError(f"Formato inesperado do Ollama: {resp}")
+
+    if not embs or len(embs) != expected:
+        raise ValueError(f"Ollama retornou {len(embs or [])} embeddings, esperado {expected}.")
+    return [list(e) for e in embs]
 
 
 def get_embedding_function():
@@ -0,0 +1,139 @@
+"""
+Tabelas auxiliares do índice, gravadas ao lado do ChromaDB.
+
+Em vez de repetir em cada linha de metadados o caminho do PDF e a string
+de URLs, o Chroma guarda só um doc_id inteiro. Aqui ficam:
+- documents: doc_id -> caminho do PDF (relativo ao projeto);
+- urls: tabela de URLs sem repetição;
+- chunk_urls: por documento, chunk id -> índices na tabela de URLs.
+
+Na leitura as URLs de cada chunk são resolvidas uma única vez, por
+(doc_id, chunk id).
+"""
+import os
+import sys
+import json
+import logging
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from app.config import INDEX_TABLES_FILE
+from app.utils import project_relpath
+
+logger = logging.getLogger("app.index_tables")
+logger.setLevel(logging.INFO)
+
+
+class IndexTables:
+
+    def __init__(self, documents: List[str] = None, urls: List[str] = None,
+                 chunk_urls: Dict[str, Dict[str, List[int]]] = None):
+        self.documents = documents or []
+        self.urls = [sys.intern(u) for u in (urls or [])]
+        self.chunk_urls = chunk_urls or {}
+        self._url_ids = {u: i for i, u in enumerate(self.urls)}
+        self._resolved = None
+
+    def doc_id(self, pdf_path: str) -> int:
+        return self._key_id(project_relpath(pdf_path))
+
+    def _key_id(self, key: str) -> int:
+        if key not in self.documents:
+            self.documents.append(key)
+        return self.documents.index(key)
+
+    def clear_document(self, doc_id: int):
+        self.chunk_urls.pop(str(doc_id), None)
+        self._resolved = None
+
+    def set_chunk_urls(self, doc_id: int, chunk_id: str, urls: Iterable[str]):
+        ids = []
+        for url in urls:
+            if url not in self._url_ids:
+                self._url_ids[url] = len(self.urls)
+                self.urls.append(sys.intern(url))
+            ids.append(self._url_ids[url])
+        if ids:
+            self.chunk_urls.setdefault(str(doc_id), {})[chunk_id] = ids
+        self._resolved = None
+
+    def urls_for(self, doc_id: int, chunk_id: str) -> Tuple[str, ...]:
+        # Ids de chunk usam o nome do PDF, que pode se repetir entre shards
+        if self._resolved is None:
+            self._resolved = {
+                (did, cid): tuple(self.urls[i] for i in ids)
+                for did, chunks in self.chunk_urls.items()
+                for cid, ids in chunks.items()
+            }
+        return self._resolved.get((str(doc_id), chunk_id), ())
+
+    def merge(self, other: "IndexTables", doc_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Traz de other os documentos doc_ids (ids de other) com suas URLs,
+        substituindo o que houver aqui para o mesmo PDF. Os demais
+        documentos locais mantêm seus ids. Devolve id em other -> id local.
+        """
+        mapping = {}
+        for other_id in doc_ids:
+            local_id = self._key_id(other.documents[other_id])
+            self.clear_document(local_id)
+            for chunk_id, ids in other.chunk_urls.get(str(other_id), {}).items():
+                self.set_chunk_urls(local_id, chunk_id, [other.urls[i] for i in ids])
+            mapping[other_id] = local_id
+        return mapping
+
+    def to_dict(self) -> dict:
+        return {
+            "documents": self.documents,
+            "urls": self.urls,
+            "chunk_urls": self.chunk_urls,
+        }
+
+
+_tables = None
+_tables_mtime = None
+_tables_lock = threading.Lock()
+
+
+def _file_mtime():
+    try:
+        return os.stat(INDEX_TABLES_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_index_tables() -> IndexTables:
+    """
+    Tabelas do índice em memória. São relidas do disco quando o arquivo
+    muda (ex.: reindex ou snapshot-import rodados em outro processo).
+    """
+    global _tables, _tables_mtime
+    mtime = _file_mtime()
+    if _tables is None or mtime != _tables_mtime:
+        with _tables_lock:
+            if _tables is None or mtime != _tables_mtime:
+                data = {}
+                if mtime is not None:
+                    try:
+                        with open(INDEX_TABLES_FILE, "r", encoding="utf-8") as fh:
+                            data = json.load(fh)
+                    except Exception as e:
+                        logger.error(f"Erro ao ler tabelas do índice '{INDEX_TABLES_FILE}': {e}")
+                _tables = IndexTables(**data)
+                _tables_mtime = mtime
+    return _tables
+
+
+def save_index_tables(tables: IndexTables):
+    global _tables, _tables_mtime
+    try:
+        os.makedirs(os.path.dirname(INDEX_TABLES_FILE), exist_ok=True)
+        tmp = INDEX_TABLES_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(tables.to_dict(), fh, ensure_ascii=False)
+        os.replace(tmp, INDEX_TABLES_FILE)
+    except Exception as e:
+        logger.error(f"Erro ao salvar tabelas do índice '{INDEX_TABLES_FILE}': {e}")
+    with _tables_lock:
+        _tables = tables
+        _tables_mtime = _file_mtime()
@@ -0,0 +1,162 @@
+# app/llm_client.py
+
+"""
+Cliente do Gemini compartilhado pelo processo.
+
+- Um único GenerativeModel/GenerationConfig, criado na primeira chamada.
+- Coalescência (single-flight): chamadas simultâneas com a mesma chave
+  esperam a mesma requisição em andamento em vez de gerar outra.
+- Controle de admissão (app/admission.py) antes de cada chamada real;
+  quem pega carona numa chamada em voo não consome orçamento.
+"""
+
+import time
+import threading
+import logging
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from app.admission import AdmissionController, LLMBusyError, PRIORITY_INTERACTIVE
+from app.config import (
+    GEMINI_API_KEY,
+    GEMINI_MODEL_NAME,
+    LLM_MAX_RPS,
+    LLM_MAX_TPM,
+    LLM_QUEUE_MAX,
+    LLM_QUEUE_TIMEOUT,
+    LLM_EST_OUTPUT_TOKENS,
+    LLM_THROTTLE_PAUSE,
+)
+from app.utils import estimate_tokens
+
+logger = logging.getLogger("app.llm_client")
+logger.setLevel(logging.INFO)
+
+try:
+    genai.configure(api_key=GEMINI_API_KEY)
+except Exception as e:
+    logger.error(f"Erro ao configurar API do Gemini: {e}")
+
+
+_model = None
+_generation_config = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """
+    Retorna (model, generation_config), criados uma única vez por processo.
+    """
+    global _model, _generation_config
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _generation_config = genai.types.GenerationConfig(
+                    temperature=0.2,
+                    top_p=0.8,
+                    top_k=40
+                )
+                _model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    return _model, _generation_config
+
+
+class SingleFlight:
+    """
+    Garante no máximo uma execução em andamento por chave. Quem chega
+    enquanto a chave está em voo recebe o mesmo resultado (ou exceção).
+    O líder registra um contexto (context); se follow for dado, cada
+    seguidor chama follow(future, context) em vez de só esperar o futuro.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def do(self, key, fn, context=None, follow=None):
+        with self._lock:
+            entry = self._inflight.get(key)
+            leader = entry is None
+            if leader:
+                entry = (Future(), context)
+                self._inflight[key] = entry
+
+        fut, leader_context = entry
+
+        if not leader:
+            if follow is not None:
+                return follow(fut, leader_context)
+            return fut.result()
+
+        try:
+            fut.set_result(fn())
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+        return fut.result()
+
+
+_flight = SingleFlight()
+
+admission = AdmissionController(
+    max_rps=LLM_MAX_RPS,
+    max_tpm=LLM_MAX_TPM,
+    max_queue=LLM_QUEUE_MAX,
+    timeout=LLM_QUEUE_TIMEOUT,
+)
+
+
+def _call_gemini(prompt: str, ticket) -> str:
+    admission.acquire(ticket)
+
+    model, generation_config = get_model()
+    try:
+        response = model.generate_content(
+            prompt,
+            generation_config=generation_config
+        )
+    except google_exceptions.TooManyRequests as e:
+        # Limite do provedor: segura novas admissões por um tempo
+        logger.warning(f"[Gemini] Limite de requisições do provedor: {e}")
+        admission.pause(LLM_THROTTLE_PAUSE)
+        raise LLMBusyError(LLM_THROTTLE_PAUSE)
+    return response.text
+
+
+def generate(prompt: str, dedup_key: str = None,
+             priority: int = PRIORITY_INTERACTIVE, timeout: float = None) -> str:
+    """
+    Gera a resposta do Gemini para o prompt. Chamadas concorrentes com o
+    mesmo dedup_key compartilham a mesma requisição.
+    Levanta LLMBusyError se a chamada não for admitida a tempo.
+    """
+    ticket = admission.ticket(
+        estimate_tokens(prompt) + LLM_EST_OUTPUT_TOKENS,
+        priority=priority,
+        timeout=timeout
+    )
+    if dedup_key is None:
+        return _call_gemini(prompt, ticket)
+
+    def follow(fut, leader_ticket):
+        # Seguidor com prioridade maior (ex.: aluno atrás de um item de lote)
+        # antecipa o líder na fila, mas o prazo do líder não muda: o seguidor
+        # aplica o próprio prazo enquanto o líder não for admitido.
+        admission.promote(leader_ticket, priority)
+        try:
+            return fut.result(timeout=max(0.0, ticket.deadline - time.monotonic()))
+        except FutureTimeout:
+            if leader_ticket.admitted:
+                return fut.result()
+            raise LLMBusyError(admission.retry_after(ticket.tokens))
+
+    return _flight.do(
+        dedup_key,
+        lambda: _call_gemini(prompt, ticket),
+        context=ticket,
+        follow=follow
+    )
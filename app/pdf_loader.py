@@ -1,80 +1,251 @@
+import re
+import json
+import hashlib
 import logging
 import os
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
 from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
 
-from app.config import CHUNK_SIZE, CHUNK_OVERLAP
-from app.utils import extract_urls, contains_paren_link, normalize_whitespace
+from app.config import PDF_BACKEND, PAGE_CACHE_FILE
+from app.chunking import get_chunker
+from app.utils import normalize_lines, project_relpath
 
 logger = logging.getLogger("app.pdf_loader")
 logger.setLevel(logging.INFO)
 
 
-def extract_text_from_pdf(pdf_path: str):
-    """
-    Extração leve usando PyPDF2.
-    Versão silenciosa, sem prints de debug.
-    """
-    chunks = []
+# (número da página, hash da página ou None, função que extrai o texto)
+PageSource = Tuple[int, Optional[str], Callable[[], str]]
 
-    abs_path = os.path.abspath(pdf_path)
+PDF_REF = re.compile(rb"(\d+) 0 R")
+PDF_PARENT = re.compile(rb"/Parent\s+\d+ 0 R")
 
-    if not os.path.exists(abs_path):
-        logger.error(f"[PDF] Não encontrado: {abs_path}")
-        return chunks
 
-    try:
+def _page_hash(page_number: int, contents: bytes, resources: str) -> str:
+    h = hashlib.sha1()
+    h.update(f"{page_number}:{resources}:".encode("ascii"))
+    h.update(contents or b"")
+    return h.hexdigest()
+
+
+class PdfBackend(ABC):
+    """
+    Interface dos extratores de texto. pages() deve ser barato: o hash sai
+    dos bytes brutos da página e a extração só roda se ela não estiver no
+    cache.
+
+    O hash cobre o número da página, os content streams e os /Resources,
+    seguindo as referências (Form XObjects e seus próprios recursos, fontes,
+    ToUnicode). Fica de fora o que está fora da página, como a versão da
+    biblioteca de extração. Se o hash falhar, a página vem com hash None e
+    é sempre extraída.
+    """
+    name = ""
+
+    @abstractmethod
+    def pages(self, abs_path: str) -> Iterator[PageSource]:
+        ...
+
+
+class PyPDF2Backend(PdfBackend):
+    name = "pypdf2"
+
+    @staticmethod
+    def _stream_data(obj) -> bytes:
+        if obj is None:
+            return b""
+        obj = obj.get_object()
+        if isinstance(obj, ArrayObject):
+            return b"".join(PyPDF2Backend._stream_data(s) for s in obj)
+        return obj.get_data()
+
+    def _digest(self, obj, memo: Dict[int, str]) -> str:
+        """
+        Digest de um objeto PDF e de tudo que ele referencia. Objetos
+        indiretos são calculados uma vez por documento.
+        """
+        if isinstance(obj, IndirectObject):
+            if obj.idnum in memo:
+                return memo[obj.idnum]
+            memo[obj.idnum] = ""  # ciclo: referência já em andamento
+            memo[obj.idnum] = self._digest(obj.get_object(), memo)
+            return memo[obj.idnum]
+
+        h = hashlib.sha1()
+        if isinstance(obj, DictionaryObject):
+            for key in sorted(obj):
+                if key == "/Parent":
+                    continue
+                h.update(f"{key}={self._digest(obj.raw_get(key), memo)};".encode("utf-8"))
+            if isinstance(obj, StreamObject):
+                h.update(obj.get_data())
+        elif isinstance(obj, ArrayObject):
+            for item in obj:
+                h.update(f"{self._digest(item, memo)},".encode("utf-8"))
+        else:
+            h.update(repr(obj).encode("utf-8"))
+        return h.hexdigest()
+
+    def pages(self, abs_path: str) -> Iterator[PageSource]:
         reader = PdfReader(abs_path)
-        num_pages = len(reader.pages)
-    except Exception as e:
-        logger.error(f"[PDF] Erro ao abrir PDF: {e}")
-        return chunks
+        memo = {}
+        for idx, page in enumerate(reader.pages):
+            try:
+                resources = self._digest(page.raw_get("/Resources"), memo) if "/Resources" in page else ""
+                page_hash = _page_hash(idx + 1, self._stream_data(page.get_contents()), resources)
+            except Exception as e:
+                logger.warning(f"[PDF] Página {idx + 1}: hash indisponível ({e}); sem cache.")
+                page_hash = None
+            yield idx + 1, page_hash, (lambda p=page: p.extract_text() or "")
+
+
+class PyMuPDFBackend(PdfBackend):
+    name = "pymupdf"
+
+    @staticmethod
+    def _digest(doc, xref: int, memo: Dict[int, str]) -> str:
+        if xref in memo:
+            return memo[xref]
+        memo[xref] = ""  # ciclo: referência já em andamento
+
+        source = doc.xref_object(xref, compressed=True).encode("utf-8", "replace")
+        source = PDF_PARENT.sub(b"", source)
+        h = hashlib.sha1(source)
+        if doc.xref_is_stream(xref):
+            h.update(doc.xref_stream(xref) or b"")
+        for ref in PDF_REF.findall(source):
+            h.update(PyMuPDFBackend._digest(doc, int(ref), memo).encode("ascii"))
+
+        memo[xref] = h.hexdigest()
+        return memo[xref]
+
+    def _resources(self, doc, page, memo: Dict[int, str]) -> str:
+        kind, value = doc.xref_get_key(page.xref, "Resources")
+        if kind == "null":
+            # Recursos herdados da árvore de páginas: usa os objetos resolvidos
+            refs = sorted(
+                {f[0] for f in page.get_fonts(full=True)}
+                | {x[0] for x in page.get_xobjects()}
+                | {i[0] for i in page.get_images(full=True)}
+            )
+            return ",".join(self._digest(doc, xref, memo) for xref in refs if xref > 0)
+
+        source = PDF_PARENT.sub(b"", value.encode("utf-8", "replace"))
+        h = hashlib.sha1(source)
+        for ref in PDF_REF.findall(source):
+            h.update(self._digest(doc, int(ref), memo).encode("ascii"))
+        return h.hexdigest()
+
+    def pages(self, abs_path: str) -> Iterator[PageSource]:
+        doc = pymupdf.open(abs_path)
+        memo = {}
+        try:
+            for page in doc:
+                try:
+                    page_hash = _page_hash(page.number + 1, page.read_contents(), self._resources(doc, page, memo))
+                except Exception as e:
+                    logger.warning(f"[PDF] Página {page.number + 1}: hash indisponível ({e}); sem cache.")
+                    page_hash = None
+                yield page.number + 1, page_hash, (lambda p=page: p.get_text() or "")
+        finally:
+            doc.close()
+
+
+PDF_BACKENDS = {
+    "pypdf2": PyPDF2Backend,
+    "pymupdf": PyMuPDFBackend,
+}
 
-    total_chunks = 0
 
-    for page_number in range(num_pages):
+def get_pdf_backend(name: str = PDF_BACKEND) -> PdfBackend:
+    """
+    Backend configurado, com PyPDF2 como fallback.
+    """
+    if name == "pymupdf" and pymupdf is None:
+        logger.warning("[PDF] PyMuPDF não instalado. Usando PyPDF2.")
+        name = "pypdf2"
+    backend_cls = PDF_BACKENDS.get(name)
+    if backend_cls is None:
+        logger.warning(f"[PDF] Backend '{name}' desconhecido. Usando PyPDF2.")
+        backend_cls = PyPDF2Backend
+    return backend_cls()
+
+
+# Cache de texto por página: {pdf relativo ao projeto: {"backend:hash da página": texto normalizado}}
+def load_page_cache() -> dict:
+    if os.path.exists(PAGE_CACHE_FILE):
         try:
-            page = reader.pages[page_number]
-            raw_text = page.extract_text() or ""
-            text = normalize_whitespace(raw_text)
+            with open(PAGE_CACHE_FILE, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except Exception:
+            return {}
+    return {}
 
-            text_size = len(text)
 
-            if not text:
-                continue
+def save_page_cache(cache: dict):
+    try:
+        with open(PAGE_CACHE_FILE, "w", encoding="utf-8") as fh:
+            json.dump(cache, fh, ensure_ascii=False)
+    except Exception as e:
+        logger.error(f"Erro ao salvar cache de páginas '{PAGE_CACHE_FILE}': {e}")
+
+
+def extract_text_from_pdf(pdf_path: str):
+    """
+    Extrai o texto página a página com o backend configurado e repassa à
+    estratégia de chunking. Páginas cujo conteúdo e recursos não mudaram
+    vêm do cache, sem parsing.
+    """
+    chunks = []
 
-            start = 0
-            text_len = len(text)
-            
-            step = CHUNK_SIZE - CHUNK_OVERLAP
-            if step <= 0:
-                step = CHUNK_SIZE
+    abs_path = os.path.abspath(pdf_path)
 
-            while start < text_len:
-                end = min(start + CHUNK_SIZE, text_len)
-                chunk_text = text[start:end]
+    if not os.path.exists(abs_path):
+        logger.error(f"[PDF] Não encontrado: {abs_path}")
+        return chunks
 
-                urls = extract_urls(chunk_text)
+    backend = get_pdf_backend()
+    cache = load_page_cache()
+    cache_key = project_relpath(abs_path)
+    old_entries = cache.get(cache_key, {})
+    new_entries = {}
 
-                chunks.append({
-                    "pdf_name": pdf_path,
-                    "page_number": page_number + 1,
-                    "text": chunk_text,
-                    "char_start": start,
-                    "char_end": end,
-                    "contains_paren_link": contains_paren_link(chunk_text),
-                    "source_urls": "||".join(urls),
-                })
+    pages = []
+    cached = 0
 
-                total_chunks += 1
+    try:
+        for page_number, page_hash, extract in backend.pages(abs_path):
+            key = f"{backend.name}:{page_hash}" if page_hash else None
+            try:
+                if key in old_entries:
+                    text = old_entries[key]
+                    cached += 1
+                else:
+                    text = normalize_lines(extract())
+                if key:
+                    new_entries[key] = text
+            except Exception as e:
+                print(f"[PDF DEBUG] Erro na página {page_number}: {e}")
+                continue
 
-                if end == text_len:
-                    break 
+            if text:
+                pages.append((page_number, text))
+    except Exception as e:
+        logger.error(f"[PDF] Erro ao abrir PDF: {e}")
+        return chunks
 
-                start += step 
+    cache[cache_key] = new_entries
+    save_page_cache(cache)
 
-        except Exception as e:
-            print(f"[PDF DEBUG] Erro na página {page_number+1}: {e}")
-            continue
+    chunks = get_chunker()(pages)
 
-    print(f"    -> {len(chunks)} chunks extraídos.")
-    return chunks
\ No newline at end of file
+    print(f"    -> {len(chunks)} chunks extraídos ({cached} páginas do cache, backend {backend.name}).")
+    return chunks
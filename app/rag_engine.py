@@ -1,31 +1,27 @@
 # app/rag_engine.py
 
 import re
+import hashlib
 import unicodedata
 import logging
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 
-from app import chroma_manager
-# AQUI IMPORTAMOS A CHAVE DO ARQUIVO DE CONFIGURAÇÃO
+from app import chroma_manager, llm_client
+from app.admission import LLMBusyError, PRIORITY_INTERACTIVE, PRIORITY_BATCH
 from app.config import (
-    GEMINI_API_KEY,      
-    GEMINI_MODEL_NAME,
     MAX_CONTEXT_CHUNKS,
-    PEDAGOGICAL_TERMS
+    PEDAGOGICAL_TERMS,
+    BATCH_LLM_CONCURRENCY,
+    LLM_BATCH_QUEUE_TIMEOUT
 )
+from app.index_tables import load_index_tables
 from app.utils import URL_REGEX
 
 logger = logging.getLogger("app.rag_engine")
 logger.setLevel(logging.INFO)
 
-# ============================================================
-# CONFIGURAÇÃO SEGURA
-# ============================================================
-# Note que aqui usamos a variável importada, não o texto solto
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    logger.error(f"Erro ao configurar API do Gemini: {e}")
+# A configuração da chave do Gemini fica em app/llm_client.py
 
 # ... (MANTENHA AS MENSAGENS PADRÃO IGUAIS) ...
 
@@ -38,6 +34,11 @@ FALLBACK_MSG = (
     f"{WHATSAPP_LINK}"
 )
 
+BUSY_MSG = (
+    "Estou recebendo muitas perguntas neste momento. "
+    "Por favor, tente novamente em alguns segundos."
+)
+
 GREETINGS_KEYWORDS = {
     "oi", "ola", "olá", "bom dia", "boa tarde", "boa noite", 
     "tudo bem", "e ai", "hey", "opa"
@@ -91,39 +92,39 @@ def score_chunk(doc_text: str, metadata: dict, q_norm: str):
 def build_context_text(sorted_chunks):
     allowed_urls = set()
     parts = []
+    tables = load_index_tables()
     for item in sorted_chunks:
         doc = item["document"]
-        md = item["metadata"]
-        raw_urls = md.get("source_urls", "")
-        urls = raw_urls.split("||") if raw_urls else []
-        urls = [u for u in urls if u]
-        for u in urls: allowed_urls.add(u)
+        urls = tables.urls_for((item.get("metadata") or {}).get("doc_id"), item["id"])
+        allowed_urls.update(urls)
         block = f"{doc}"
         if urls: block += "\nLinks úteis: " + ", ".join(urls)
         parts.append(block)
     context = "\n\n---\n\n".join(parts)
     return context, allowed_urls
 
-def get_answer_from_rag(query: str) -> str:
-    if not query or not query.strip(): return FALLBACK_MSG
+def _preprocess_query(query: str):
+    """
+    Normaliza a pergunta e resolve as respostas diretas (saudação, contato).
+    Retorna (q, q_correct, q_norm, resposta_direta).
+    """
+    if not query or not query.strip(): return None, None, None, FALLBACK_MSG
 
     q = query.strip()
     q_correct = q.replace("congrad", "comgrad").replace("CONGRAD", "COMGRAD")
     q_norm = normalize_text(q_correct)
 
-    if check_greeting(q_norm): return check_greeting(q_norm)
-    if check_contact_intent(q_norm): return check_contact_intent(q_norm)
+    if check_greeting(q_norm): return q, q_correct, q_norm, check_greeting(q_norm)
+    if check_contact_intent(q_norm): return q, q_correct, q_norm, check_contact_intent(q_norm)
 
-    try:
-        collection = chroma_manager.get_or_create_collection()
-        alt_query = f"{q_correct} PPC Projeto Pedagógico Curricular currículo link oficial repositório Letras UFRGS"
-        res_main, res_alt = chroma_manager.vector_search(collection, q_correct, alt_query, k=10)
-    except Exception as e:
-        logger.error(f"Erro na busca vetorial: {e}")
-        return FALLBACK_MSG
+    return q, q_correct, q_norm, None
+
+def _alt_query(q_correct: str) -> str:
+    return f"{q_correct} PPC Projeto Pedagógico Curricular currículo link oficial repositório Letras UFRGS"
 
+def _collect_docs(results):
     docs = []
-    for res in (res_main, res_alt):
+    for res in results:
         if not isinstance(res, dict): continue
         _docs = res.get("documents", [])
         _metas = res.get("metadatas", [])
@@ -133,9 +134,9 @@ def get_answer_from_rag(query: str) -> str:
         if _ids and isinstance(_ids[0], list): _ids = _ids[0]
         for doc, md, id_ in zip(_docs, _metas, _ids):
             docs.append({"id": id_, "document": doc, "metadata": md})
+    return docs
 
-    if not docs: return FALLBACK_MSG
-
+def _build_prompt(q: str, q_norm: str, docs):
     ranked = []
     for d in docs:
         score = score_chunk(d["document"], d["metadata"], q_norm)
@@ -157,21 +158,23 @@ def get_answer_from_rag(query: str) -> str:
         "4. Formate a resposta com quebras de linha para facilitar a leitura.\n"
     )
 
-    try:
-        model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-        
-        generation_config = genai.types.GenerationConfig(
-            temperature=0.2,
-            top_p=0.8,
-            top_k=40
-        )
+    # Mesma pergunta normalizada + mesmo contexto => mesma chamada ao LLM
+    q_key = " ".join(re.sub(r'[^\w\s]', '', q_norm).split())
+    dedup_key = hashlib.sha256(f"{q_key}\0{context}".encode("utf-8")).hexdigest()
+    return final_prompt, allowed_urls, dedup_key
 
-        response = model.generate_content(
+def _generate_answer(final_prompt: str, allowed_urls, dedup_key: str = None,
+                     priority: int = PRIORITY_INTERACTIVE, timeout: float = None) -> str:
+    try:
+        content = llm_client.generate(
             final_prompt,
-            generation_config=generation_config
+            dedup_key=dedup_key,
+            priority=priority,
+            timeout=timeout
         )
-        
-        content = response.text
+
+    except LLMBusyError:
+        raise
 
     except Exception as e:
         logger.exception("Erro ao chamar API do Gemini:")
@@ -185,4 +188,84 @@ def get_answer_from_rag(query: str) -> str:
         if url not in allowed_urls:
             content = content.replace(url, "")
 
-    return content
\ No newline at end of file
+    return content
+
+def get_answer_from_rag(query: str) -> str:
+    """
+    Levanta LLMBusyError quando o LLM está saturado (a rota responde 429).
+    """
+    q, q_correct, q_norm, direct = _preprocess_query(query)
+    if direct: return direct
+
+    try:
+        res_main, res_alt = chroma_manager.vector_search(
+            q_correct, _alt_query(q_correct), k=10,
+            shards=chroma_manager.route_query(q_norm)
+        )
+    except Exception as e:
+        logger.error(f"Erro na busca vetorial: {e}")
+        return FALLBACK_MSG
+
+    docs = _collect_docs((res_main, res_alt))
+    if not docs: return FALLBACK_MSG
+
+    final_prompt, allowed_urls, dedup_key = _build_prompt(q, q_norm, docs)
+    return _generate_answer(final_prompt, allowed_urls, dedup_key)
+
+def get_answers_from_rag(queries: List[str], max_concurrency: int = BATCH_LLM_CONCURRENCY) -> List[str]:
+    """
+    Versão em lote de get_answer_from_rag. Todas as consultas são embedadas
+    num só lote e buscadas com um collection.query por shard; as chamadas ao
+    Gemini rodam em paralelo (até max_concurrency), com prioridade menor
+    que as perguntas interativas. A ordem é preservada; perguntas não
+    admitidas a tempo recebem BUSY_MSG.
+    """
+    answers = [None] * len(queries)
+    pending = []
+
+    for idx, query in enumerate(queries):
+        q, q_correct, q_norm, direct = _preprocess_query(query)
+        if direct:
+            answers[idx] = direct
+        else:
+            pending.append((idx, q, q_correct, q_norm))
+
+    if pending:
+        search_queries = []
+        routes = []
+        for _, _, q_correct, q_norm in pending:
+            search_queries.extend([q_correct, _alt_query(q_correct)])
+            shards = chroma_manager.route_query(q_norm)
+            routes.extend([shards, shards])
+
+        try:
+            results = chroma_manager.vector_search_batch(search_queries, k=10, routes=routes)
+        except Exception as e:
+            logger.error(f"Erro na busca vetorial em lote: {e}")
+            results = [{} for _ in search_queries]
+
+        jobs = []
+        for pos, (idx, q, _, q_norm) in enumerate(pending):
+            docs = _collect_docs(results[2 * pos:2 * pos + 2])
+            if not docs:
+                answers[idx] = FALLBACK_MSG
+                continue
+            jobs.append((idx, _build_prompt(q, q_norm, docs)))
+
+        if jobs:
+            workers = max(1, min(max_concurrency, len(jobs)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    (idx, pool.submit(
+                        _generate_answer, prompt, allowed_urls, dedup_key,
+                        PRIORITY_BATCH, LLM_BATCH_QUEUE_TIMEOUT
+                    ))
+                    for idx, (prompt, allowed_urls, dedup_key) in jobs
+                ]
+                for idx, fut in futures:
+                    try:
+                        answers[idx] = fut.result()
+                    except LLMBusyError:
+                        answers[idx] = BUSY_MSG
+
+    return answers
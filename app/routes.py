@@ -4,15 +4,18 @@ Rotas da aplicação Flask.
 Inclui:
 - Página inicial ("/")
 - Endpoint principal /ask (POST)
+- Endpoint /ask/batch (POST, várias perguntas de uma vez)
 - Endpoint /admin/inspect (debug da busca vetorial)
 """
 
 from flask import request, jsonify, render_template
 import logging
 
-from app.rag_engine import get_answer_from_rag
-from app.chroma_manager import get_or_create_collection, vector_search
-from app.config import PEDAGOGICAL_TERMS
+from app.rag_engine import get_answer_from_rag, get_answers_from_rag, BUSY_MSG
+from app.admission import LLMBusyError
+from app.chroma_manager import vector_search, route_query
+from app.config import PEDAGOGICAL_TERMS, BATCH_MAX_QUESTIONS
+from app.utils import normalize_text
 
 
 logger = logging.getLogger("app.routes")
@@ -51,10 +54,42 @@ def register_routes(app):
 
         logger.info(f"[Pergunta] {question}")
 
-        answer = get_answer_from_rag(question)
+        try:
+            answer = get_answer_from_rag(question)
+        except LLMBusyError as e:
+            logger.warning(f"[Ocupado] Retry-After {e.retry_after}s")
+            response = jsonify({"answer": BUSY_MSG, "retry_after": e.retry_after})
+            response.headers["Retry-After"] = str(e.retry_after)
+            return response, 429
 
         return jsonify({"answer": answer})
 
+    @app.route("/ask/batch", methods=["POST"])
+    def ask_batch_api():
+        """
+        Corpo: {"questions": ["pergunta 1", "pergunta 2", ...]}
+        Resposta: {"answers": [{"question": ..., "answer": ...}, ...]} na mesma ordem.
+        """
+        data = request.get_json(force=True) or {}
+
+        questions = data.get("questions")
+
+        if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+            return jsonify({"error": "Campo 'questions' deve ser uma lista de strings."}), 400
+
+        if len(questions) > BATCH_MAX_QUESTIONS:
+            return jsonify({"error": f"Máximo de {BATCH_MAX_QUESTIONS} perguntas por lote."}), 400
+
+        logger.info(f"[Lote] {len(questions)} perguntas")
+
+        answers = get_answers_from_rag(questions)
+
+        return jsonify({
+            "answers": [
+                {"question": q, "answer": a} for q, a in zip(questions, answers)
+            ]
+        })
+
     @app.route("/admin/inspect", methods=["GET"])
     def inspect():
         """
@@ -69,15 +104,16 @@ def register_routes(app):
 
         logger.info(f"[Inspect] Query: {q}")
 
-        collection = get_or_create_collection()
+        shards = route_query(normalize_text(q))
 
         alt_terms = " ".join(PEDAGOGICAL_TERMS)
         alt_query = f"{q} {alt_terms}"
 
-        res_main, res_alt = vector_search(collection, q, alt_query)
+        res_main, res_alt = vector_search(q, alt_query, shards=shards)
 
         return jsonify({
             "query": q,
+            "shards": shards,
             "main_results": _json_safe(res_main),
             "alt_results": _json_safe(res_alt)
         })
@@ -0,0 +1,398 @@
+"""
+Exportação e importação de snapshots do índice vetorial.
+
+O snapshot é um arquivo zip (comprimido) com:
+- manifest.json: versão do formato, modelo de embedding, dimensão,
+  hashes dos PDFs (por caminho relativo ao projeto) e checksums SHA-256
+  de cada arquivo interno;
+- collections/<nome>/records.json: ids, documentos e metadados;
+- collections/<nome>/vectors.npy: embeddings em float32;
+- index_tables.json: tabelas de documentos e URLs (app/index_tables.py).
+
+A importação grava os vetores direto no ChromaDB, sem chamar o Ollama.
+As tabelas do snapshot são mescladas às locais: os doc_id das linhas
+importadas são traduzidos para os ids locais, e os shards fora do
+snapshot continuam válidos.
+"""
+import io
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+import zipfile
+from typing import Dict, List, Any
+
+import numpy as np
+
+from app.config import (
+    OLLAMA_EMBEDDING_MODEL,
+    SHARDS,
+    SNAPSHOT_FORMAT_VERSION,
+    SNAPSHOT_BATCH_SIZE,
+)
+from app.chroma_manager import (
+    active_shards,
+    get_chroma_client,
+    get_or_create_collection,
+    load_hash_map,
+    save_hash_map,
+)
+from app.index_tables import IndexTables, load_index_tables, save_index_tables
+from app.utils import project_relpath
+
+
+logger = logging.getLogger("app.snapshot")
+logger.setLevel(logging.INFO)
+
+MANIFEST_NAME = "manifest.json"
+TABLES_NAME = "index_tables.json"
+STAGING_SUFFIX = "_import"
+
+
+class SnapshotError(Exception):
+    """Snapshot inválido, corrompido ou incompatível com esta instalação."""
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _local_pdfs() -> Dict[str, str]:
+    """
+    Caminho relativo ao projeto -> caminho local, para todos os shards.
+    """
+    return {
+        project_relpath(p): p
+        for shard in SHARDS.values()
+        for p in shard["pdf_files"]
+    }
+
+
+def _read_collection(collection) -> Dict[str, Any]:
+    ids: List[str] = []
+    documents: List[str] = []
+    metadatas: List[dict] = []
+    vectors = []
+
+    total = collection.count()
+    for offset in range(0, total, SNAPSHOT_BATCH_SIZE):
+        page = collection.get(
+            limit=SNAPSHOT_BATCH_SIZE,
+            offset=offset,
+            include=["documents", "metadatas", "embeddings"]
+        )
+        ids.extend(page.get("ids") or [])
+        documents.extend(page.get("documents") or [])
+        metadatas.extend(page.get("metadatas") or [])
+        embeddings = page.get("embeddings")
+        if embeddings is not None and len(embeddings):
+            vectors.append(np.asarray(embeddings, dtype=np.float32))
+
+    matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    return {
+        "ids": ids,
+        "documents": documents,
+        "metadatas": metadatas,
+        "vectors": matrix,
+    }
+
+
+def export_snapshot(output_path: str, collection_names: List[str] = None) -> dict:
+    """
+    Exporta as coleções indicadas (padrão: as de todos os shards ativos)
+    para um snapshot. Retorna o manifesto gravado.
+    """
+    collection_names = collection_names or [SHARDS[name]["collection"] for name in active_shards()]
+
+    files: Dict[str, bytes] = {}
+    collections_info = []
+    dimension = None
+
+    for name in collection_names:
+        collection = get_or_create_collection(name)
+        data = _read_collection(collection)
+
+        if not data["ids"]:
+            logger.warning(f"[Snapshot] Coleção '{name}' está vazia; ignorada.")
+            continue
+
+        matrix = data["vectors"]
+        if matrix.shape[0] != len(data["ids"]):
+            raise SnapshotError(
+                f"Coleção '{name}' tem {len(data['ids'])} registros, "
+                f"mas {matrix.shape[0]} embeddings."
+            )
+        if dimension is None:
+            dimension = int(matrix.shape[1])
+        elif dimension != matrix.shape[1]:
+            raise SnapshotError("Coleções com dimensões de embedding diferentes.")
+
+        records_name = f"collections/{name}/records.json"
+        vectors_name = f"collections/{name}/vectors.npy"
+
+        files[records_name] = json.dumps({
+            "ids": data["ids"],
+            "documents": data["documents"],
+            "metadatas": data["metadatas"],
+        }, ensure_ascii=False).encode("utf-8")
+
+        buf = io.BytesIO()
+        np.save(buf, matrix, allow_pickle=False)
+        files[vectors_name] = buf.getvalue()
+
+        collections_info.append({
+            "name": name,
+            "count": len(data["ids"]),
+            "records": records_name,
+            "vectors": vectors_name,
+        })
+
+    if not collections_info:
+        raise SnapshotError("Nenhuma coleção com dados para exportar.")
+
+    files[TABLES_NAME] = json.dumps(
+        load_index_tables().to_dict(), ensure_ascii=False
+    ).encode("utf-8")
+
+    # Caminhos absolutos mudam de nó para nó; o manifesto guarda o caminho
+    # relativo ao projeto (PDFs de shards diferentes podem ter o mesmo nome)
+    hash_map = {
+        project_relpath(path): digest
+        for path, digest in load_hash_map().items()
+    }
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "embedding_model": OLLAMA_EMBEDDING_MODEL,
+        "dimension": dimension,
+        "hash_map": hash_map,
+        "collections": collections_info,
+        "checksums": {fname: _sha256(blob) for fname, blob in files.items()},
+    }
+
+    abs_out = os.path.abspath(output_path)
+    tmp_out = abs_out + ".tmp"
+    with zipfile.ZipFile(tmp_out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for fname, blob in files.items():
+            zf.writestr(fname, blob)
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2, ensure_ascii=False))
+    os.replace(tmp_out, abs_out)
+
+    total = sum(c["count"] for c in collections_info)
+    logger.info(f"[Snapshot] {total} chunks exportados para '{abs_out}'.")
+    return manifest
+
+
+def _read_verified(zf: zipfile.ZipFile, fname: str, checksums: Dict[str, str]) -> bytes:
+    expected = checksums.get(fname)
+    if not expected:
+        raise SnapshotError(f"Arquivo '{fname}' sem checksum no manifesto.")
+    try:
+        blob = zf.read(fname)
+    except KeyError:
+        raise SnapshotError(f"Arquivo '{fname}' ausente no snapshot.")
+    if _sha256(blob) != expected:
+        raise SnapshotError(f"Checksum inválido para '{fname}'.")
+    return blob
+
+
+def _load_snapshot(snapshot_path: str):
+    abs_path = os.path.abspath(snapshot_path)
+    if not os.path.exists(abs_path):
+        raise SnapshotError(f"Snapshot não encontrado: {abs_path}")
+
+    try:
+        zf = zipfile.ZipFile(abs_path, "r")
+    except zipfile.BadZipFile as e:
+        raise SnapshotError(f"Snapshot corrompido: {e}")
+
+    with zf:
+        try:
+            manifest = json.loads(zf.read(MANIFEST_NAME).decode("utf-8"))
+        except (KeyError, ValueError) as e:
+            raise SnapshotError(f"Manifesto ausente ou inválido: {e}")
+
+        version = manifest.get("format_version")
+        if version != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError(
+                f"Versão de snapshot {version} incompatível "
+                f"(esperado {SNAPSHOT_FORMAT_VERSION})."
+            )
+
+        checksums = manifest.get("checksums", {})
+        dimension = manifest.get("dimension")
+        collections = []
+
+        # Valida tudo antes de tocar no banco
+        for info in manifest.get("collections", []):
+            records = json.loads(
+                _read_verified(zf, info["records"], checksums).decode("utf-8")
+            )
+            vectors = np.load(
+                io.BytesIO(_read_verified(zf, info["vectors"], checksums)),
+                allow_pickle=False
+            )
+            if vectors.ndim != 2 or vectors.shape[1] != dimension:
+                raise SnapshotError(
+                    f"Dimensão dos vetores de '{info['name']}' difere do manifesto."
+                )
+            if vectors.shape[0] != len(records.get("ids", [])):
+                raise SnapshotError(
+                    f"Quantidade de vetores de '{info['name']}' difere dos registros."
+                )
+            collections.append((info["name"], records, vectors))
+
+        tables = IndexTables(**json.loads(
+            _read_verified(zf, TABLES_NAME, checksums).decode("utf-8")
+        ))
+
+    return manifest, collections, tables
+
+
+def _read_manifest(snapshot_path: str) -> dict:
+    try:
+        with zipfile.ZipFile(os.path.abspath(snapshot_path), "r") as zf:
+            return json.loads(zf.read(MANIFEST_NAME).decode("utf-8"))
+    except Exception as e:
+        raise SnapshotError(f"Manifesto ausente ou inválido: {e}")
+
+
+def snapshot_is_current(snapshot_path: str) -> bool:
+    """
+    True se o índice local já corresponde ao snapshot (mesmos hashes de PDF
+    e coleções com a mesma quantidade de chunks). Lê só o manifesto.
+    """
+    try:
+        manifest = _read_manifest(snapshot_path)
+    except SnapshotError:
+        return False
+
+    local_pdfs = _local_pdfs()
+    hash_map = load_hash_map()
+    for rel, digest in manifest.get("hash_map", {}).items():
+        if rel in local_pdfs and hash_map.get(local_pdfs[rel]) != digest:
+            return False
+
+    try:
+        for info in manifest.get("collections", []):
+            if get_or_create_collection(info["name"]).count() != info["count"]:
+                return False
+    except Exception:
+        return False
+    return True
+
+
+def _remap_doc_ids(collections, snapshot_tables: IndexTables, local_tables: IndexTables):
+    """
+    Mescla as tabelas do snapshot nas locais e reescreve o doc_id dos
+    metadados importados com os ids locais.
+    """
+    used = {
+        md["doc_id"]
+        for _, records, _ in collections
+        for md in records["metadatas"]
+        if md and "doc_id" in md
+    }
+    invalid = [d for d in used if not 0 <= d < len(snapshot_tables.documents)]
+    if invalid:
+        raise SnapshotError(f"Metadados com doc_id fora das tabelas do snapshot: {sorted(invalid)}")
+
+    mapping = local_tables.merge(snapshot_tables, sorted(used))
+    for _, records, _ in collections:
+        records["metadatas"] = [
+            dict(md, doc_id=mapping[md["doc_id"]]) if md and "doc_id" in md else md
+            for md in records["metadatas"]
+        ]
+
+
+def _drop_collection(client, name: str):
+    try:
+        client.delete_collection(name)
+    except Exception:
+        pass
+
+
+def import_snapshot(snapshot_path: str, allow_model_mismatch: bool = False) -> dict:
+    """
+    Substitui as coleções locais pelo conteúdo do snapshot, sem re-embedding.
+    Também grava o hash map, para que update_embeddings() não reindexe os
+    PDFs vindos do snapshot.
+
+    Os dados entram primeiro em coleções temporárias; as atuais só são
+    trocadas depois que todas foram gravadas. Antes da troca os hashes dos
+    PDFs afetados saem do hash map, então uma falha no meio do caminho faz
+    update_embeddings() reindexar em vez de confiar num índice incompleto.
+    """
+    manifest, collections, tables = _load_snapshot(snapshot_path)
+
+    model = manifest.get("embedding_model")
+    if model != OLLAMA_EMBEDDING_MODEL and not allow_model_mismatch:
+        raise SnapshotError(
+            f"Snapshot gerado com '{model}', mas o modelo configurado é "
+            f"'{OLLAMA_EMBEDDING_MODEL}'."
+        )
+
+    local_pdfs = _local_pdfs()
+    client = get_chroma_client()
+
+    local_tables = copy.deepcopy(load_index_tables())
+    _remap_doc_ids(collections, tables, local_tables)
+
+    staged = []
+    try:
+        for name, records, vectors in collections:
+            staging_name = f"{name}{STAGING_SUFFIX}"
+            _drop_collection(client, staging_name)
+            collection = get_or_create_collection(staging_name)
+            staged.append((name, staging_name))
+
+            ids = records["ids"]
+            documents = records["documents"]
+            metadatas = records["metadatas"]
+
+            for start in range(0, len(ids), SNAPSHOT_BATCH_SIZE):
+                end = start + SNAPSHOT_BATCH_SIZE
+                collection.add(
+                    ids=ids[start:end],
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end],
+                    embeddings=vectors[start:end]
+                )
+            logger.info(f"[Snapshot] Coleção '{name}': {len(ids)} chunks preparados.")
+    except Exception as e:
+        for _, staging_name in staged:
+            _drop_collection(client, staging_name)
+        raise SnapshotError(f"Falha ao gravar coleções do snapshot: {e}")
+
+    # Todos os PDFs dos shards substituídos perdem o hash: os que não vierem
+    # no snapshot ficam sem chunks e precisam ser reindexados
+    replaced = {name for name, _ in staged}
+    replaced_pdfs = {
+        pdf
+        for shard in SHARDS.values() if shard["collection"] in replaced
+        for pdf in shard["pdf_files"]
+    }
+    affected = replaced_pdfs | {
+        local_pdfs[rel] for rel in manifest.get("hash_map", {}) if rel in local_pdfs
+    }
+    hash_map = load_hash_map()
+    for pdf in affected:
+        hash_map.pop(pdf, None)
+    save_hash_map(hash_map)
+
+    save_index_tables(local_tables)
+
+    for name, staging_name in staged:
+        _drop_collection(client, name)
+        client.get_collection(staging_name).modify(name=name)
+
+    # Só os PDFs cujos chunks vieram no snapshot
+    for rel, digest in manifest.get("hash_map", {}).items():
+        if rel in local_pdfs and local_pdfs[rel] in replaced_pdfs:
+            hash_map[local_pdfs[rel]] = digest
+    save_hash_map(hash_map)
+
+    return manifest
@@ -1,6 +1,9 @@
+import os
 import re
 import unicodedata
 
+from app.config import CHARS_PER_TOKEN, PROJECT_ROOT
+
 URL_REGEX = re.compile(
     r"(https?://[^\s\)\]\}\>\.,;:]+)"
 )
@@ -38,6 +41,17 @@ def normalize_whitespace(s: str) -> str:
     return re.sub(r"\s+", " ", s).strip()
 
 
+def normalize_lines(s: str) -> str:
+    """
+    Normaliza o whitespace dentro de cada linha e remove linhas vazias,
+    preservando as quebras de linha (úteis para detectar estrutura).
+    """
+    if not s:
+        return ""
+    lines = (normalize_whitespace(line) for line in s.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
 def normalize_text(s: str) -> str:
     """
     Remove acentos, converte para minúsculas e normaliza whitespace.
@@ -52,6 +66,16 @@ def normalize_text(s: str) -> str:
 
     return s
 
+def estimate_tokens(text: str) -> int:
+    """
+    Estimativa rápida de tokens: razão fixa de CHARS_PER_TOKEN caracteres
+    por token, sem tokenizador. Suficiente para orçamento de rate limit e
+    tamanho de chunk, mas não é a contagem real do modelo.
+    """
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
 def detect_language_heuristic(text: str) -> str:
     """
     Heurística muito simples para detectar idioma.
@@ -74,3 +98,16 @@ def detect_language_heuristic(text: str) -> str:
         return "it"
 
     return "pt"
+
+
+def project_relpath(path: str) -> str:
+    """
+    Caminho relativo à raiz do projeto, com "/" (igual em todos os nós).
+    Arquivos fora do projeto ficam com o caminho absoluto.
+    """
+    abs_path = os.path.abspath(path)
+    try:
+        rel = os.path.relpath(abs_path, PROJECT_ROOT)
+    except ValueError:
+        return abs_path
+    return abs_path if rel.startswith("..") else rel.replace(os.sep, "/")
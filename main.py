@@ -1,23 +1,66 @@
 """
 Ponto de entrada da aplicação Flask.
+
+Uso:
+    python main.py                            # atualiza o RAG e sobe o servidor
+    python main.py snapshot-export <arquivo>  # exporta o índice para um snapshot
+    python main.py snapshot-import <arquivo>  # importa um snapshot (sem re-embedding)
+    python main.py reindex [--shard NOME]     # atualiza o índice (todos ou alguns shards)
 """
 
 import os
+import sys
 import logging
+import argparse
 
 
 from app import create_app
 from app.chroma_manager import update_embeddings
+from app.config import SNAPSHOT_PATH, SHARDS
 
 
 logger = logging.getLogger("main")
 logger.setLevel(logging.INFO)
 
 
-if __name__ == "__main__":
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Assistente virtual do Instituto de Letras.")
+    sub = parser.add_subparsers(dest="command")
 
-    BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-    os.chdir(BASE_DIR)
+    exp = sub.add_parser("snapshot-export", help="Exporta o índice vetorial para um snapshot.")
+    exp.add_argument("path", help="Arquivo de saída (.zip).")
+
+    imp = sub.add_parser("snapshot-import", help="Importa um snapshot sem recalcular embeddings.")
+    imp.add_argument("path", help="Arquivo de snapshot (.zip).")
+    imp.add_argument(
+        "--allow-model-mismatch",
+        action="store_true",
+        help="Importa mesmo se o modelo de embedding for diferente do configurado."
+    )
+
+    rei = sub.add_parser("reindex", help="Atualiza o índice sem subir o servidor.")
+    rei.add_argument(
+        "--shard",
+        action="append",
+        choices=sorted(SHARDS),
+        help="Shard a reindexar (pode repetir). Padrão: todos."
+    )
+
+    return parser.parse_args(argv)
+
+
+def run_server():
+    if SNAPSHOT_PATH:
+        from app.snapshot import import_snapshot, snapshot_is_current
+        try:
+            if snapshot_is_current(SNAPSHOT_PATH):
+                print(f"\n--- Snapshot '{SNAPSHOT_PATH}' já importado ---")
+            else:
+                print(f"\n--- Importando snapshot '{SNAPSHOT_PATH}' ---")
+                import_snapshot(SNAPSHOT_PATH)
+        except Exception as e:
+            print(f"[ERRO] Falha ao importar snapshot: {e}")
+            print(">> Os embeddings serão recalculados a partir dos PDFs.\n")
 
     try:
         update_embeddings()
@@ -33,4 +76,38 @@ if __name__ == "__main__":
         host="127.0.0.1",
         port=5000,
         debug=True
-    )
\ No newline at end of file
+    )
+
+
+if __name__ == "__main__":
+
+    BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+    os.chdir(BASE_DIR)
+
+    args = parse_args(sys.argv[1:])
+
+    if args.command == "snapshot-export":
+        from app.snapshot import export_snapshot, SnapshotError
+        try:
+            manifest = export_snapshot(args.path)
+        except SnapshotError as e:
+            print(f"[ERRO] {e}")
+            sys.exit(1)
+        total = sum(c["count"] for c in manifest["collections"])
+        print(f"Snapshot gravado em '{args.path}' ({total} chunks, dimensão {manifest['dimension']}).")
+
+    elif args.command == "snapshot-import":
+        from app.snapshot import import_snapshot, SnapshotError
+        try:
+            manifest = import_snapshot(args.path, allow_model_mismatch=args.allow_model_mismatch)
+        except SnapshotError as e:
+            print(f"[ERRO] {e}")
+            sys.exit(1)
+        total = sum(c["count"] for c in manifest["collections"])
+        print(f"Snapshot importado ({total} chunks, modelo {manifest['embedding_model']}).")
+
+    elif args.command == "reindex":
+        update_embeddings(shard_names=args.shard)
+
+    else:
+        run_server()
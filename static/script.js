@@ -85,7 +85,8 @@ function sendMessage() {
     body: JSON.stringify({ question: text })
   })
     .then(res => {
-      if (!res.ok) throw new Error("Erro na rede");
+      // 429 = servidor ocupado; a resposta traz a mensagem para o aluno
+      if (!res.ok && res.status !== 429) throw new Error("Erro na rede");
       return res.json();
     })
     .then(data => {